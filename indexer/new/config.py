@@ -14,6 +14,7 @@ DB_PATH = r"RemakeRegistry\Games\TheSimpsonsGame\GameFilesIndex_Modular3.db"
 # Tools
 QUICKBMS_EXE = r"Tools\QuickBMS\exe\quickbms.exe"
 BMS_SCRIPT = r"RemakeRegistry\Games\TheSimpsonsGame\Scripts\simpsons_str.bms"
+EXTRACTION_WORKERS = max(1, (os.cpu_count() or 2) // 2) # QuickBMS processes run at once in Pass 2 (mostly disk-bound)
 
 # --- File Extension Groupings & Table Mapping ---
 # Defines how file extensions are grouped and which primary table they might map to.
@@ -40,10 +41,20 @@ EXT_GROUPS = {
 PHASH_IMG_SIZE = 8
 DHASH_IMG_SIZE = 8
 AHASH_IMG_SIZE = 8
+# Threads hashing files while the main thread writes to the DB. hashlib and the image resize/DCT
+# release the GIL, and reads block on disk, so oversubscribing the cores a little keeps them busy.
+HASH_WORKERS = min(16, (os.cpu_count() or 1) * 2)
 
 # --- Database Parameters ---
-MAX_DB_RETRIES = 5
-RETRY_DELAY_SEC = 1
+DB_BUSY_TIMEOUT_SEC = 30      # SQLite's own busy handler waits this long for a lock before reporting "database is locked"
+DB_PAGE_SIZE = 16384          # Only takes effect when the database file is first created
+DB_MMAP_SIZE = 1 << 30        # Bytes of the database file SQLite may memory-map for reads
+DB_CACHE_SIZE_KIB = 262144    # Page cache size in KiB (passed to PRAGMA cache_size as a negative value)
+DB_CACHED_STATEMENTS = 256   # Prepared statements kept per connection (sqlite3 default is 128)
+DB_COMMIT_INTERVAL = 500      # Root files indexed per transaction in Pass 1 (STR archives commit once each)
+# Build missing secondary lookup indexes once after the passes (one sort per index) instead of
+# updating them row by row during a first full load. The UNIQUE constraints are always in place.
+DEFER_SECONDARY_INDEXES = True
 
 # --- Path Normalization Helper (Optional but recommended) ---
 def_abs_path = lambda p: os.path.join(BASE_PROJECT_DIR, p) if not os.path.isabs(p) else p
@@ -52,6 +63,6 @@ def_abs_path = lambda p: os.path.join(BASE_PROJECT_DIR, p) if not os.path.isabs(
 # Example: DB_PATH = def_abs_path(DB_PATH) if you want it relative to project root
 # For this refactor, we'll assume the user sets them as absolute or correctly relative.
 
-# --- Logging Configuration (Placeholder) ---
-LOG_LEVEL = "INFO"
+# --- Logging Configuration ---
+LOG_LEVEL = "INFO" # "INFO" prints a line per indexed file; "WARNING" keeps only pass summaries and problems
 LOG_FILE = "file_processor.log"
\ No newline at end of file
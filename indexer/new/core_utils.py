@@ -1,14 +1,40 @@
+import functools
 import hashlib
+import logging
+import mmap
 import sys
 import os
 
+# Per-file progress lines ("Indexed ...", "Found existing ...") go through this logger so they can be
+# silenced with config.LOG_LEVEL; main() attaches a plain stdout handler. Pass/summary messages and
+# warnings/errors stay as print().
+logger = logging.getLogger("file_processor")
+
+# Read size for the chunked hashing fallback. 8 KiB reads spend most of their time in
+# per-call overhead on large .str archives; gains flatten out somewhere past 64 KiB.
+HASH_CHUNK_SIZE = 1 << 20 # 1 MiB
+# Files at least this big (large .str archives) are hashed straight from a read-only mmap:
+# one update() over the mapping, no per-chunk copies, GIL released for the whole file.
+MMAP_HASH_THRESHOLD = 8 << 20 # 8 MiB
+
 def sha256_file(path: str) -> str | None:
     """Calculates the SHA256 hash of a file."""
-    h = hashlib.sha256()
     try:
-        with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                h.update(chunk)
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"): # Linux: hint the kernel to read ahead aggressively on cold files
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            if os.fstat(f.fileno()).st_size >= MMAP_HASH_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mmap, "MADV_SEQUENTIAL"):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    return hashlib.sha256(mm).hexdigest()
+            if hasattr(hashlib, "file_digest"): # Python 3.11+: read/update loop runs in C
+                return hashlib.file_digest(f, "sha256").hexdigest()
+            h = hashlib.sha256()
+            buf = bytearray(HASH_CHUNK_SIZE) # Reused for every read: no new bytes object per chunk
+            view = memoryview(buf)
+            while n := f.readinto(buf):
+                h.update(view[:n])
             return h.hexdigest()
     except IOError as e:
         print(f"ERROR: Error reading file for SHA256 hashing {path}: {e}", file=sys.stderr)
@@ -17,6 +43,77 @@ def sha256_file(path: str) -> str | None:
         print(f"ERROR: Unexpected error during SHA256 hashing for {path}: {e}", file=sys.stderr)
         return None
 
+def drop_file_cache(path: str):
+    """
+    Linux only, best effort: asks the kernel to evict a file's clean pages from the page cache.
+    Used on large .str archives once they have been extracted and hashed, so they stop crowding
+    out the database and the freshly extracted files that are read next.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+def file_stat(path: str | os.DirEntry) -> tuple[int | None, int | None]:
+    """
+    Returns (size, mtime in ns) of a file, or (None, None) if it can't be stat'ed.
+    For an os.DirEntry the stat cached by scandir is used (free on Windows).
+    """
+    try:
+        st = path.stat() if isinstance(path, os.DirEntry) else os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return None, None
+
+def iter_files(base_dir: str, exclude_dir: str | None = None):
+    """
+    Yields os.DirEntry objects for every file under base_dir. Uses os.scandir with an explicit
+    stack, so file/dir types come from the directory listing instead of a stat per entry.
+    Symlinked directories are not followed (like os.walk). exclude_dir, if given, is pruned
+    entirely (e.g. the extraction output directory when it lives inside the input tree).
+    """
+    abs_exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    # Each stacked directory carries its absolute path, built by joining names onto the base's,
+    # so the exclude check needs no abspath() (getcwd + normalisation) per directory.
+    dirs_to_scan = [(base_dir, os.path.abspath(base_dir))]
+    while dirs_to_scan:
+        current_dir, abs_current_dir = dirs_to_scan.pop()
+        try:
+            with os.scandir(current_dir) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        abs_entry_path = os.path.join(abs_current_dir, entry.name)
+                        if abs_entry_path != abs_exclude_dir:
+                            dirs_to_scan.append((entry.path, abs_entry_path))
+                    elif entry.is_file():
+                        yield entry
+        except OSError as e:
+            print(f"WARNING: Could not scan directory {current_dir}: {e}", file=sys.stderr)
+
+def iter_files_with_ext(root_dir: str, ext: str):
+    """
+    Yields os.DirEntry objects for the files under root_dir whose name ends with ext
+    (lowercase, e.g. ".dds"; matched case-insensitively).
+    """
+    return (entry for entry in iter_files(root_dir) if entry.name.lower().endswith(ext))
+
+def get_file_ext(file_name: str) -> str:
+    """
+    Lowercased extension of a bare file name, same result as os.path.splitext(file_name)[1].lower()
+    (leading dots don't start an extension) without splitext's generic separator handling.
+    """
+    dot = file_name.rfind('.')
+    if dot <= 0 or (file_name[0] == '.' and not file_name[:dot].lstrip('.')):
+        return ""
+    return file_name[dot:].lower()
+
+@functools.lru_cache(maxsize=65536) # The same relative paths come back across passes and re-runs
 def md5_string(s: str) -> str:
     """Calculates the MD5 hash of a string."""
     return hashlib.md5(s.encode('utf-8')).hexdigest()
@@ -27,15 +124,35 @@ def generate_uuid(file_hash: str, path_hash: str) -> str:
         raise ValueError("File hash and path hash must be provided to generate UUID.")
     return f"{file_hash[:16]}_{path_hash[:16]}"
 
+@functools.lru_cache(maxsize=None)
+def _abspath_of_base(base_path: str) -> str:
+    """os.path.abspath for the handful of base directories, computed once each."""
+    return os.path.abspath(base_path)
+
+def is_under_dir(abs_path: str, abs_dir: str) -> bool:
+    """
+    True if abs_path is abs_dir or lies inside it. Both must be absolute and normalised.
+    Unlike a bare startswith, "/data/out" is not treated as containing "/data/output/x".
+    """
+    if not abs_path.startswith(abs_dir):
+        return False
+    return len(abs_path) == len(abs_dir) or abs_dir.endswith(os.sep) or abs_path[len(abs_dir)] == os.sep
+
 def get_relative_path(full_path: str, base_path: str) -> str:
     """
     Calculates a relative path. Falls back to full_path if not under base_path.
     Ensures consistent use of forward slashes.
     """
+    # Fast path: full_path was built by joining names onto base_path (as the directory scans do),
+    # so the relative path is simply the rest of the string.
+    if base_path and full_path.startswith(base_path) and full_path[len(base_path):len(base_path) + 1] == os.sep \
+            and not base_path.endswith(os.sep):
+        return full_path[len(base_path) + 1:].replace("\\", "/")
+
     abs_full_path = os.path.abspath(full_path)
-    abs_base_path = os.path.abspath(base_path)
+    abs_base_path = _abspath_of_base(base_path)
     try:
-        if abs_full_path.startswith(abs_base_path):
+        if is_under_dir(abs_full_path, abs_base_path):
             rel_path = os.path.relpath(abs_full_path, start=abs_base_path)
         else:
             # If the file is not under the base_path, using its absolute path
@@ -1,9 +1,12 @@
 # This can be empty or used to expose parts of the submodules
 from .connection import get_db_connection, close_db_connection
-from .schema import initialize_database, get_table_name_for_ext
+from .schema import initialize_database, ensure_secondary_indexes, get_table_name_for_ext
 from .operations import (
     insert_file_entry,
     get_file_uuid_by_path,
     get_file_uuid_by_hash_and_path, # More specific if needed
-    insert_relationship_entry
+    get_unchanged_file_uuid,
+    insert_relationship_entry,
+    insert_relationship_entries,
+    commit_batch
 )
\ No newline at end of file
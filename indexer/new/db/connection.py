@@ -4,32 +4,31 @@ import config # Use .. to go up one level to the main package directory
 
 _connection = None
 
-def get_db_connection(db_path: str = config.DB_PATH, max_retries: int = config.MAX_DB_RETRIES, retry_delay: int = config.RETRY_DELAY_SEC):
+def get_db_connection(db_path: str = config.DB_PATH):
     """Establishes and returns a SQLite database connection."""
     global _connection
     if _connection is None:
-        for attempt in range(max_retries):
-            try:
-                _connection = sqlite3.connect(db_path, timeout=10) # Increased timeout
-                _connection.execute("PRAGMA foreign_keys = ON;")
-                _connection.execute("PRAGMA journal_mode = WAL;") # Write-Ahead Logging for better concurrency
-                _connection.row_factory = sqlite3.Row # Access columns by name
-                print(f"Database connection established to: {db_path}")
-                return _connection
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e):
-                    if attempt < max_retries - 1:
-                        print(f"Database locked. Retrying ({attempt + 1}/{max_retries})...", file=sys.stderr)
-                        time.sleep(retry_delay)
-                    else:
-                        print(f"FATAL: Could not connect to database {db_path} after {max_retries} retries: {e}", file=sys.stderr)
-                        raise
-                else:
-                    print(f"FATAL: sqlite3.OperationalError connecting to {db_path}: {e}", file=sys.stderr)
-                    raise
-            except Exception as e:
-                print(f"FATAL: Unexpected error connecting to database {db_path}: {e}", file=sys.stderr)
-                raise
+        try:
+            # timeout installs SQLite's busy_timeout: lock waits happen inside SQLite, and a
+            # "database is locked" that still comes back is not worth retrying from Python.
+            _connection = sqlite3.connect(db_path, timeout=config.DB_BUSY_TIMEOUT_SEC,
+                                          cached_statements=config.DB_CACHED_STATEMENTS)
+            _connection.execute("PRAGMA foreign_keys = ON;")
+            # page_size must be set before the first write (and before switching to WAL) to apply
+            _connection.execute(f"PRAGMA page_size = {config.DB_PAGE_SIZE};")
+            _connection.execute("PRAGMA journal_mode = WAL;") # Write-Ahead Logging for better concurrency
+            _connection.execute("PRAGMA synchronous = NORMAL;") # Safe with WAL; no fsync on every commit
+            _connection.execute("PRAGMA temp_store = MEMORY;")
+            _connection.execute(f"PRAGMA mmap_size = {config.DB_MMAP_SIZE};") # Serve hot pages from the mapping instead of read() calls
+            _connection.execute(f"PRAGMA cache_size = -{config.DB_CACHE_SIZE_KIB};")
+            _connection.row_factory = sqlite3.Row # Access columns by name
+            print(f"Database connection established to: {db_path}")
+        except sqlite3.OperationalError as e:
+            print(f"FATAL: sqlite3.OperationalError connecting to {db_path}: {e}", file=sys.stderr)
+            raise
+        except Exception as e:
+            print(f"FATAL: Unexpected error connecting to database {db_path}: {e}", file=sys.stderr)
+            raise
     return _connection
 
 
@@ -39,4 +38,6 @@ def close_db_connection():
     if _connection:
         _connection.close()
         _connection = None
+        from db import operations as db_ops # Local import: operations imports this module
+        db_ops.clear_caches() # A later connection must not trust rows cached from this one
         print("Database connection closed.")
\ No newline at end of file
@@ -1,47 +1,59 @@
+import functools
 import sqlite3
-import time
 import sys
 import config # Use .. for relative import from parent package
 from db.schema import get_table_name_for_ext # To determine target table
 
-def _execute_with_retry(conn: sqlite3.Connection, sql: str, params: tuple = (), commit: bool = False, fetch_one: bool = False, fetch_all: bool = False):
-    """Helper to execute SQL with retry logic for locked database."""
+# Rows already in each file table: {table_name: {source_path: (uuid, file_size, file_mtime_ns)}}.
+# Loaded with a single SELECT the first time a table is consulted and kept in step with inserts,
+# so re-runs can skip hashing files that are already indexed and unchanged on disk.
+_known_files: dict[str, dict[str, tuple]] = {}
+
+@functools.lru_cache(maxsize=None)
+def _insert_sql(table_name: str, columns: tuple, on_conflict: str = "", verb: str = "INSERT") -> str:
+    """
+    Builds (once per table/column set) the INSERT statement used by the insert helpers.
+    Reusing the identical string also lets the connection's statement cache skip re-parsing.
+    """
+    cols = ', '.join(columns)
+    placeholders = ', '.join(['?'] * len(columns))
+    return f"{verb} INTO {table_name} ({cols}) VALUES ({placeholders}){on_conflict}"
+
+def _execute_with_retry(conn: sqlite3.Connection, sql: str, params: tuple = (), commit: bool = False, fetch_one: bool = False, fetch_all: bool = False, many: bool = False):
+    """
+    Helper to execute SQL and report failures.
+    Lock waits are left to SQLite's busy_timeout (set on connect); a "database is locked" that
+    outlasts it is raised like any other operational error, since retrying inside the same open
+    transaction can't clear it.
+    With many=True, params is a sequence of parameter tuples passed to executemany.
+    Writes are left in the caller's open transaction unless commit=True; errors are
+    re-raised without rolling back so one failed statement doesn't discard the batch.
+    """
     cursor = conn.cursor()
-    for attempt in range(config.MAX_DB_RETRIES):
-        try:
+    try:
+        if many:
+            cursor.executemany(sql, params)
+        else:
             cursor.execute(sql, params)
-            if commit:
-                conn.commit()
-            
-            if fetch_one:
-                return cursor.fetchone()
-            if fetch_all:
-                return cursor.fetchall()
-            return cursor # Or True if commit and no fetch
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                if attempt < config.MAX_DB_RETRIES - 1:
-                    # print(f"DB locked. Retrying query ({sql[:30]}...) attempt {attempt+1}", file=sys.stderr)
-                    time.sleep(config.RETRY_DELAY_SEC * (attempt + 1)) # Exponential backoff
-                    continue
-                else:
-                    print(f"ERROR: DB query failed due to persistent lock: {sql[:100]}... - {e}", file=sys.stderr)
-                    conn.rollback() # Rollback if a transaction was implicitly started by DML
-                    raise
-            else: # Other operational errors
-                print(f"ERROR: Operational error executing SQL: {sql[:100]}... - {e}", file=sys.stderr)
-                conn.rollback()
-                raise
-        except sqlite3.IntegrityError as e:
-             # For INSERTs, this is often expected (e.g., UNIQUE constraint violation)
-             # Let the calling function handle this by checking return values or catching it.
-            conn.rollback()
-            raise # Re-raise to be handled by caller
-        except Exception as e:
-            print(f"ERROR: Unexpected error executing SQL: {sql[:100]}... - {e}", file=sys.stderr)
-            conn.rollback()
-            raise
-    return None # Should be unreachable if retries fail and raise
+        if commit:
+            conn.commit()
+
+        if fetch_one:
+            return cursor.fetchone()
+        if fetch_all:
+            return cursor.fetchall()
+        return cursor # Or True if commit and no fetch
+    except sqlite3.IntegrityError:
+        # For INSERTs, this is often expected (e.g., UNIQUE constraint violation)
+        # Let the calling function handle this by checking return values or catching it.
+        # SQLite only undoes the failing statement, so the surrounding batch stays intact.
+        raise # Re-raise to be handled by caller
+    except sqlite3.OperationalError as e:
+        print(f"ERROR: Operational error executing SQL: {sql[:100]}... - {e}", file=sys.stderr)
+        raise
+    except Exception as e:
+        print(f"ERROR: Unexpected error executing SQL: {sql[:100]}... - {e}", file=sys.stderr)
+        raise
 
 def get_file_uuid_by_path(conn: sqlite3.Connection, table_name: str, source_path: str) -> str | None:
     """Fetches a file's UUID from a given table by its source_path."""
@@ -53,6 +65,36 @@ def get_file_uuid_by_path(conn: sqlite3.Connection, table_name: str, source_path
         print(f"INFO: Could not fetch UUID by path for {source_path} in {table_name} (may not exist): {e}", file=sys.stderr)
         return None
 
+def clear_caches():
+    """Forgets the rows cached from the database; called when the connection is closed."""
+    _known_files.clear()
+
+def _get_known_files(conn: sqlite3.Connection, table_name: str) -> dict:
+    """Returns the source_path cache for a table, loading it on first use."""
+    known = _known_files.get(table_name)
+    if known is None:
+        known = {}
+        try:
+            for row in conn.execute(f"SELECT source_path, uuid, file_size, file_mtime_ns FROM {table_name}"):
+                known[row[0]] = (row[1], row[2], row[3])
+        except sqlite3.Error as e:
+            print(f"WARNING: Could not preload indexed paths from {table_name}: {e}", file=sys.stderr)
+        _known_files[table_name] = known
+    return known
+
+def get_unchanged_file_uuid(conn: sqlite3.Connection, table_name: str, source_path: str,
+                            file_size: int | None, file_mtime_ns: int | None) -> str | None:
+    """
+    Returns the UUID of an already indexed file if its size and mtime still match
+    what was recorded when it was hashed, i.e. it doesn't need to be hashed again.
+    """
+    if file_size is None or file_mtime_ns is None:
+        return None
+    entry = _get_known_files(conn, table_name).get(source_path)
+    if entry and entry[1] == file_size and entry[2] == file_mtime_ns:
+        return entry[0]
+    return None
+
 def get_file_uuid_by_hash_and_path(conn: sqlite3.Connection, table_name: str, file_hash: str, path_hash: str) -> str | None:
     """Fetches a file's UUID by its file_hash and path_hash (more specific than just path)."""
     # This assumes UUID is constructed from these or they are otherwise queryable for this purpose.
@@ -68,8 +110,8 @@ def get_file_uuid_by_hash_and_path(conn: sqlite3.Connection, table_name: str, fi
 
 def insert_file_entry(conn: sqlite3.Connection, table_name: str, data: dict) -> str | None:
     """
-    Inserts a file entry into the specified table.
-    Handles IntegrityError if the entry (based on source_path or uuid) already exists.
+    Inserts a file entry into the specified table (committed by the caller).
+    If the entry (based on source_path or uuid) already exists, nothing is written.
     Returns the UUID of the inserted or existing record.
     'data' dict should contain keys matching table columns (e.g., uuid, source_file_name, source_path, etc.).
     """
@@ -78,60 +120,103 @@ def insert_file_entry(conn: sqlite3.Connection, table_name: str, data: dict) ->
         print(f"ERROR: 'source_path' and 'uuid' are required in data for insert_file_entry into {table_name}.", file=sys.stderr)
         return None
 
-    cols = ', '.join(data.keys())
-    placeholders = ', '.join(['?'] * len(data))
-    sql = f"INSERT INTO {table_name} ({cols}) VALUES ({placeholders})"
+    # DO NOTHING rather than a no-op DO UPDATE: an UPDATE would fire the last_updated trigger.
+    # rowcount is 1 only when the insert actually happened (upsert syntax needs SQLite 3.24+).
+    sql = _insert_sql(table_name, tuple(data), " ON CONFLICT DO NOTHING")
 
     try:
-        _execute_with_retry(conn, sql, tuple(data.values()), commit=True)
-        # print(f"    Indexed: {data.get('source_path', data.get('uuid'))} into {table_name}")
-        return data['uuid']
-    except sqlite3.IntegrityError:
-        # Entry likely already exists. Try to fetch its UUID.
-        # Prefer fetching by source_path as it's usually the UNIQUE constraint violated first for files.
-        existing_uuid = get_file_uuid_by_path(conn, table_name, data['source_path'])
-        if existing_uuid:
-            # print(f"    Info: File already indexed (by path): {data['source_path']} in {table_name}. UUID: {existing_uuid}")
-            return existing_uuid
-        
-        # If not found by path, but UUID was the conflict (less common if path is also unique)
-        # This path implies a hash collision leading to same UUID for different paths,
-        # OR, data['source_path'] was different but data['uuid'] was the same.
-        # The schema usually has UNIQUE on source_path AND UNIQUE on uuid.
-        try:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT source_path FROM {table_name} WHERE uuid = ?", (data['uuid'],))
-            row = cursor.fetchone()
-            if row:
-                # print(f"    Info: File UUID {data['uuid']} already exists in {table_name} (path: {row['source_path']}).")
-                return data['uuid'] # Return the conflicting UUID
-        except sqlite3.Error:
-            pass # Fall through if this secondary check fails
-
-        print(f"WARNING: IntegrityError for {data.get('source_path')} in {table_name}, but could not retrieve existing UUID.", file=sys.stderr)
-        return None # Indicate an issue
+        cursor = _execute_with_retry(conn, sql, tuple(data.values()))
     except sqlite3.Error as e: # Catch other errors from _execute_with_retry
         print(f"ERROR: Failed to insert file entry into {table_name} for {data.get('source_path')}: {e}", file=sys.stderr)
         return None
 
+    if cursor.rowcount == 1:
+        # print(f"    Indexed: {data.get('source_path', data.get('uuid'))} into {table_name}")
+        _get_known_files(conn, table_name)[data['source_path']] = (data['uuid'], data.get('file_size'), data.get('file_mtime_ns'))
+        return data['uuid']
+
+    # Entry already exists. Prefer its UUID by source_path, as that's usually the UNIQUE constraint hit for files.
+    existing_uuid = get_file_uuid_by_path(conn, table_name, data['source_path'])
+    if existing_uuid:
+        # print(f"    Info: File already indexed (by path): {data['source_path']} in {table_name}. UUID: {existing_uuid}")
+        if existing_uuid == data['uuid'] and 'file_size' in data:
+            # Same path and content as the stored row (e.g. indexed before sizes were recorded,
+            # or only touched since): record the current stat so the next run can skip it.
+            _refresh_file_stat(conn, table_name, data)
+        return existing_uuid
+
+    # If not found by path, the UUID itself was the conflict: a hash collision leading to the
+    # same UUID for a different path. The schema has UNIQUE on source_path AND UNIQUE on uuid.
+    try:
+        row = _execute_with_retry(conn, f"SELECT source_path FROM {table_name} WHERE uuid = ?", (data['uuid'],), fetch_one=True)
+        if row:
+            # print(f"    Info: File UUID {data['uuid']} already exists in {table_name} (path: {row['source_path']}).")
+            return data['uuid'] # Return the conflicting UUID
+    except sqlite3.Error:
+        pass # Fall through if this secondary check fails
+
+    print(f"WARNING: {data.get('source_path')} already conflicts with a row in {table_name}, but could not retrieve existing UUID.", file=sys.stderr)
+    return None # Indicate an issue
+
+
+def _refresh_file_stat(conn: sqlite3.Connection, table_name: str, data: dict):
+    """Updates the stored size/mtime of an existing row whose content is unchanged."""
+    sql = f"UPDATE {table_name} SET file_size = ?, file_mtime_ns = ? WHERE source_path = ?"
+    try:
+        _execute_with_retry(conn, sql, (data['file_size'], data.get('file_mtime_ns'), data['source_path']))
+        _get_known_files(conn, table_name)[data['source_path']] = (data['uuid'], data['file_size'], data.get('file_mtime_ns'))
+    except sqlite3.Error as e:
+        print(f"WARNING: Could not update file size/mtime for {data['source_path']} in {table_name}: {e}", file=sys.stderr)
+
 
 def insert_relationship_entry(conn: sqlite3.Connection, relationship_table_name: str, data: dict) -> bool:
     """
-    Inserts an entry into a relationship table.
-    Handles IntegrityError if the relationship already exists.
+    Inserts an entry into a relationship table (committed by the caller).
+    An existing identical relationship is skipped by INSERT OR IGNORE, without raising.
     Returns True if inserted or already existed, False on other errors.
     """
-    cols = ', '.join(data.keys())
-    placeholders = ', '.join(['?'] * len(data))
-    sql = f"INSERT INTO {relationship_table_name} ({cols}) VALUES ({placeholders})"
+    sql = _insert_sql(relationship_table_name, tuple(data), verb="INSERT OR IGNORE")
 
     try:
-        _execute_with_retry(conn, sql, tuple(data.values()), commit=True)
+        _execute_with_retry(conn, sql, tuple(data.values()))
         # print(f"    Created relationship in {relationship_table_name}: {data}")
         return True
     except sqlite3.IntegrityError:
-        # print(f"    Info: Relationship already exists in {relationship_table_name} for {data}.")
-        return True # Relationship already exists, considered success for this function's purpose
+        # Constraints OR IGNORE doesn't cover (foreign keys) are still treated as before
+        return True # Considered success for this function's purpose
     except sqlite3.Error as e: # Catch other errors
         print(f"ERROR: Failed to insert relationship into {relationship_table_name} for {data}: {e}", file=sys.stderr)
-        return False
\ No newline at end of file
+        return False
+
+
+def insert_relationship_entries(conn: sqlite3.Connection, relationship_table_name: str, columns: tuple, rows: list) -> bool:
+    """
+    Inserts many rows into a relationship table with one executemany (committed by the caller).
+    Rows repeated within the batch are dropped before reaching SQLite; rows already in the table
+    are skipped by INSERT OR IGNORE.
+    Returns True if all rows were inserted or already existed, False on other errors.
+    """
+    # Each batch is one extraction's (or one TXD's) rows, so this seen-set stays bounded and goes with it
+    rows = list(dict.fromkeys(map(tuple, rows)))
+    if not rows:
+        return True
+    sql = _insert_sql(relationship_table_name, columns, verb="INSERT OR IGNORE")
+    try:
+        _execute_with_retry(conn, sql, rows, many=True)
+        return True
+    except sqlite3.IntegrityError:
+        # A constraint OR IGNORE doesn't cover (e.g. a foreign key) stopped the batch part-way.
+        # Fall back to row by row, which treats such rows the same way insert_relationship_entry does.
+        return all([insert_relationship_entry(conn, relationship_table_name, dict(zip(columns, row))) for row in rows])
+    except sqlite3.Error as e:
+        print(f"ERROR: Failed to insert {len(rows)} relationships into {relationship_table_name}: {e}", file=sys.stderr)
+        return False
+
+
+def commit_batch(conn: sqlite3.Connection):
+    """Commits the pending batch of inserts; lock waits are handled by SQLite's busy_timeout."""
+    try:
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        print(f"ERROR: Failed to commit batch: {e}", file=sys.stderr)
+        raise
@@ -1,44 +1,47 @@
+import functools
 import sqlite3
 import sys
 import config
 
+# Specific mappings based on group names in EXT_GROUPS or direct extension
+TABLE_NAME_MAPPINGS = {
+    "Archive_root": "str_index",        # .str files (archives)
+    "models_source": "preinstanced_index",   # .preinstanced files
+    "models_blend": "blend_index",    # .blend files
+    "models_glb": "glb_index",        # .glb files
+    "models_fbx": "fbx_index",        # .fbx files
+    "textures_dds": "dds_index",      # .dds files (extracted textures)
+    "texture_dictionary": "txd_index",          # .txd files (texture dictionaries)
+    "video_source": "video_index",          # .vp6 files
+    "audio_source": "snu_index",             # .snu files
+    "audio_other": "mus_index",       # .mus files
+    "other": "other_files_index",     # Default for .lua, .bin, .txt etc.
+    "unknown": "unknown_files_index",  # Catch-all for unmapped extensions
+    "audio_wav": "audio_wav_index", # .wav files
+    "video_ogv": "video_ogv_index" # .ogv files
+}
+
+@functools.lru_cache(maxsize=None) # Called for every file; the answer only depends on the extension
 def get_table_name_for_ext(ext: str) -> str:
     """
     Determines the database table name for a given file extension.
     Uses EXT_GROUPS for specific mappings, otherwise generates a name.
     """
-    sanitized_ext = ext.lstrip('.').lower()
-    group_name = config.EXT_GROUPS.get(ext.lower())
-
-    # Specific mappings based on group names in EXT_GROUPS or direct extension
-    specific_mappings = {
-        "Archive_root": "str_index",        # .str files (archives)
-        "models_source": "preinstanced_index",   # .preinstanced files
-        "models_blend": "blend_index",    # .blend files
-        "models_glb": "glb_index",        # .glb files
-        "models_fbx": "fbx_index",        # .fbx files
-        "textures_dds": "dds_index",      # .dds files (extracted textures)
-        "texture_dictionary": "txd_index",          # .txd files (texture dictionaries)
-        "video_source": "video_index",          # .vp6 files
-        "audio_source": "snu_index",             # .snu files
-        "audio_other": "mus_index",       # .mus files
-        "other": "other_files_index",     # Default for .lua, .bin, .txt etc.
-        "unknown": "unknown_files_index",  # Catch-all for unmapped extensions
-		"audio_wav": "audio_wav_index", # .wav files
-		"video_ogv": "video_ogv_index" # .ogv files
-    }
+    ext = ext.lower() # EXT_GROUPS keys are lowercase
+    sanitized_ext = ext.lstrip('.')
+    group_name = config.EXT_GROUPS.get(ext)
 
-    if group_name and group_name in specific_mappings:
-        return specific_mappings[group_name]
-    elif sanitized_ext in specific_mappings: # Direct mapping for extension if not via group
-        return specific_mappings[sanitized_ext]
+    if group_name and group_name in TABLE_NAME_MAPPINGS:
+        return TABLE_NAME_MAPPINGS[group_name]
+    elif sanitized_ext in TABLE_NAME_MAPPINGS: # Direct mapping for extension if not via group
+        return TABLE_NAME_MAPPINGS[sanitized_ext]
     elif group_name == "other":
-        return specific_mappings["other"]
+        return TABLE_NAME_MAPPINGS["other"]
     elif sanitized_ext: # Fallback for known extensions not explicitly mapped
         #print(f"WARNING: Extension '{ext}' not specifically mapped, using 'other_files_index'. Consider adding to EXT_GROUPS or specific_mappings.", file=sys.stderr)
-        return specific_mappings["unknown"]
+        return TABLE_NAME_MAPPINGS["unknown"]
     else: # Should not happen if ext is valid
-        return specific_mappings["unknown"]
+        return TABLE_NAME_MAPPINGS["unknown"]
 
 
 def create_generic_file_table(cursor: sqlite3.Cursor, table_name: str):
@@ -54,6 +57,8 @@ def create_generic_file_table(cursor: sqlite3.Cursor, table_name: str):
             file_hash TEXT, -- SHA256
             path_hash TEXT, -- MD5 of source_path
             group_name TEXT, -- From EXT_GROUPS
+            file_size INTEGER, -- Size and mtime when hashed; lets re-runs skip unchanged files
+            file_mtime_ns INTEGER,
             first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
@@ -67,6 +72,7 @@ def create_generic_file_table(cursor: sqlite3.Cursor, table_name: str):
             UPDATE {table_name} SET last_updated = CURRENT_TIMESTAMP WHERE id = OLD.id;
         END;
     """)
+    _add_missing_columns(cursor, table_name, {"file_size": "INTEGER", "file_mtime_ns": "INTEGER"})
 
 def create_dds_table(cursor: sqlite3.Cursor):
     """Creates or alters the DDS index table with image hash columns."""
@@ -86,6 +92,8 @@ def create_dds_table(cursor: sqlite3.Cursor):
             color_phash TEXT,
             color_dhash TEXT,
             color_ahash TEXT,
+            file_size INTEGER,
+            file_mtime_ns INTEGER,
             first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
@@ -104,10 +112,15 @@ def create_dds_table(cursor: sqlite3.Cursor):
     columns_to_add = {
         "phash": "TEXT", "dhash": "TEXT", "ahash": "TEXT",
         "color_phash": "TEXT", "color_dhash": "TEXT", "color_ahash": "TEXT",
+        "file_size": "INTEGER", "file_mtime_ns": "INTEGER",
         "first_seen": "TIMESTAMP", "last_updated": "TIMESTAMP" # Ensure these are also checked
     }
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    existing_columns = [row[1] for row in cursor.fetchall()]
+    _add_missing_columns(cursor, table_name, columns_to_add)
+
+
+def _add_missing_columns(cursor: sqlite3.Cursor, table_name: str, columns_to_add: dict):
+    """Adds any of the given columns that an existing table doesn't have yet."""
+    existing_columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table_name})")}
 
     for col, col_type in columns_to_add.items():
         if col not in existing_columns:
@@ -188,8 +201,35 @@ def create_relationship_tables(cursor: sqlite3.Cursor):
     #     )
     # """)
 
-def initialize_database(conn: sqlite3.Connection):
-    """Initializes all necessary tables in the database."""
+def create_secondary_indexes(cursor: sqlite3.Cursor, file_table_names):
+    """
+    Creates the lookup indexes that the UNIQUE constraints don't already provide:
+    file_hash/path_hash on every file table, and the relationship columns that are
+    queried (or cascaded on) but aren't the leading column of their table's UNIQUE index.
+    """
+    for table_name in file_table_names:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_hashes ON {table_name}(file_hash, path_hash)")
+
+    # str_uuid, txd_uuid, blend_uuid (blend_preinstanced) and exported_model_uuid already lead a UNIQUE index.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_str_content_relationship_content ON str_content_relationship(content_file_uuid)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_txd_dds_relationship_dds ON txd_dds_relationship(dds_uuid)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_blend_preinstanced_relationship_preinstanced ON blend_preinstanced_relationship(preinstanced_uuid)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_model_export_blend_relationship_blend ON model_export_blend_relationship(blend_uuid)")
+
+def ensure_secondary_indexes(conn: sqlite3.Connection):
+    """Creates any secondary indexes that initialize_database deferred, once the bulk load is done."""
+    print("Ensuring secondary indexes...")
+    file_table_names = {get_table_name_for_ext(ext_key) for ext_key in config.EXT_GROUPS}
+    file_table_names.add(get_table_name_for_ext("unknown_ext_placeholder_for_table_name_logic"))
+    create_secondary_indexes(conn.cursor(), file_table_names)
+    conn.commit()
+    print("Ensured secondary indexes.")
+
+def initialize_database(conn: sqlite3.Connection, defer_secondary_indexes: bool = False):
+    """
+    Initializes all necessary tables in the database.
+    With defer_secondary_indexes, missing secondary indexes are left for ensure_secondary_indexes.
+    """
     cursor = conn.cursor()
     print("Initializing database schema...")
 
@@ -216,6 +256,12 @@ def initialize_database(conn: sqlite3.Connection):
     create_relationship_tables(cursor)
     print("Ensured all relationship tables.")
 
+    if defer_secondary_indexes:
+        print("Deferring creation of missing secondary indexes until indexing is complete.")
+    else:
+        create_secondary_indexes(cursor, created_table_names | {unknown_table})
+        print("Ensured secondary indexes.")
+
     try:
         conn.commit()
         print("Database schema initialization complete.")
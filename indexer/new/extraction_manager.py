@@ -2,7 +2,7 @@ import os
 import subprocess
 import sys
 import config
-from core_utils import ensure_dir_exists, get_relative_path
+from core_utils import ensure_dir_exists, get_relative_path, is_under_dir
 
 def get_extraction_output_dir(str_file_path: str, input_base_dir: str, output_base_dir: str) -> str | None:
     """Determines the output directory for a given .str file."""
@@ -10,7 +10,7 @@ def get_extraction_output_dir(str_file_path: str, input_base_dir: str, output_ba
         abs_str_input_dir = os.path.abspath(input_base_dir)
         abs_file_path = os.path.abspath(str_file_path)
 
-        if not abs_file_path.startswith(abs_str_input_dir):
+        if not is_under_dir(abs_file_path, abs_str_input_dir):
             print(f"ERROR: File {str_file_path} is not under STR_INPUT_DIR {input_base_dir}. Cannot determine relative path for extraction output.", file=sys.stderr)
             return None
 
@@ -39,7 +39,6 @@ def extract_str_file(str_file_path: str, bms_script_path: str, quickbms_exe_path
 
     ensure_dir_exists(actual_output_dir)
 
-    print(f"    Extracting {str_file_path} to {actual_output_dir}...")
     try:
         # QuickBMS requires absolute paths or paths relative to its own working directory.
         # Providing absolute paths is safest.
@@ -57,9 +56,8 @@ def extract_str_file(str_file_path: str, bms_script_path: str, quickbms_exe_path
 
         process_result = subprocess.run(
             [abs_quickbms_exe, "-o", abs_bms_script, abs_str_file, abs_output_dir],
-            check=True, capture_output=False, text=True # Let QuickBMS output directly
+            check=True, stdout=subprocess.DEVNULL # Per-file listing is noise with several extractions running; errors still reach stderr
         )
-        print(f"    Successfully extracted: {str_file_path}")
         return True, actual_output_dir
     except subprocess.CalledProcessError as e:
         print(f"ERROR: Extraction failed for {str_file_path} using QuickBMS.", file=sys.stderr)
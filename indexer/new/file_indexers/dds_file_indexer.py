@@ -1,61 +1,123 @@
+import hashlib
+import io
 import os
 import sys
+import numpy as np
+import scipy.fft
 from PIL import Image, UnidentifiedImageError
-import imagehash
 
 import config
-from core_utils import sha256_file, md5_string, generate_uuid
+from core_utils import sha256_file, md5_string, generate_uuid, file_stat, MMAP_HASH_THRESHOLD, logger
 from db import operations as db_ops
 from db.schema import get_table_name_for_ext
 
-def calculate_image_hashes(img_path: str) -> dict:
-    """Calculates various image hashes for a given image file."""
+def _bits_to_hex(bits: np.ndarray) -> str:
+    """
+    Hex string of a boolean hash array, formatted like str(imagehash.ImageHash):
+    the bits read as one big-endian integer, zero-padded to ceil(n/4) digits.
+    """
+    bits = bits.ravel()
+    pad = -bits.size % 4 # Left-pad to whole nibbles so packbits' right padding falls off the end
+    if pad:
+        bits = np.concatenate((np.zeros(pad, dtype=bool), bits))
+    return np.packbits(bits).tobytes().hex()[:bits.size // 4]
+
+def _phash_hex(img: Image.Image, hash_size: int, highfreq_factor: int = 4) -> str:
+    """
+    Perceptual hash of a single-band ('L') image; same value as str(imagehash.phash(img, hash_size)).
+    One 2-D DCT over the resized pixels and a vectorised median threshold.
+    """
+    if hash_size < 2:
+        raise ValueError('Hash size must be greater than or equal to 2')
+    img_size = hash_size * highfreq_factor
+    pixels = np.asarray(img.resize((img_size, img_size), Image.LANCZOS))
+    dct_low = scipy.fft.dctn(pixels, type=2)[:hash_size, :hash_size]
+    return _bits_to_hex(dct_low > np.median(dct_low))
+
+def _dhash_hex(img: Image.Image, hash_size: int) -> str:
+    """Difference hash of an 'L' image; same value as str(imagehash.dhash(img, hash_size))."""
+    if hash_size < 2:
+        raise ValueError('Hash size must be greater than or equal to 2')
+    pixels = np.asarray(img.resize((hash_size + 1, hash_size), Image.LANCZOS))
+    return _bits_to_hex(pixels[:, 1:] > pixels[:, :-1])
+
+def _ahash_hex(img: Image.Image, hash_size: int) -> str:
+    """Average hash of an 'L' image; same value as str(imagehash.average_hash(img, hash_size))."""
+    if hash_size < 2:
+        raise ValueError('Hash size must be greater than or equal to 2')
+    pixels = np.asarray(img.resize((hash_size, hash_size), Image.LANCZOS))
+    return _bits_to_hex(pixels > pixels.mean())
+
+def _is_grayscale(channels: tuple) -> bool:
+    """True if the R, G and B bands of an image are identical."""
+    r, g, b = (np.asarray(channel) for channel in channels)
+    return np.array_equal(r, g) and np.array_equal(g, b)
+
+def calculate_image_hashes(img_path: str, img_data: bytes | None = None) -> dict:
+    """
+    Calculates various image hashes for a given image file.
+    If img_data (the file's bytes) is given, the image is decoded from it instead of re-reading img_path.
+    """
     hashes = {
         "phash": None, "dhash": None, "ahash": None,
         "color_phash": None, "color_dhash": None, "color_ahash": None
     }
     try:
-        img = Image.open(img_path)
+        with Image.open(io.BytesIO(img_data) if img_data is not None else img_path) as img:
+            img.load() # Decode the DDS once; every conversion below works from this buffer
 
-        # Grayscale Hashes
-        img_gray = None
-        if img.mode != 'L':
-            try:
-                img_gray = img.convert('L')
-            except ValueError as e:
-                print(f"        WARNING: Could not convert image {img_path} to grayscale: {e}", file=sys.stderr)
-        else:
-            img_gray = img
-        
-        if img_gray:
-            hashes["phash"] = str(imagehash.phash(img_gray, hash_size=config.PHASH_IMG_SIZE))
-            hashes["dhash"] = str(imagehash.dhash(img_gray, hash_size=config.DHASH_IMG_SIZE))
-            hashes["ahash"] = str(imagehash.average_hash(img_gray, hash_size=config.AHASH_IMG_SIZE))
-
-        # Color Hashes
-        img_rgb = None
-        if img.mode not in ('RGB', 'RGBA'):
+            # Grayscale Hashes
+            img_gray = None
+            if img.mode != 'L':
+                try:
+                    img_gray = img.convert('L')
+                except ValueError as e:
+                    print(f"        WARNING: Could not convert image {img_path} to grayscale: {e}", file=sys.stderr)
+            else:
+                img_gray = img
+
+            if img_gray:
+                hashes["phash"] = _phash_hex(img_gray, config.PHASH_IMG_SIZE)
+                hashes["dhash"] = _dhash_hex(img_gray, config.DHASH_IMG_SIZE)
+                hashes["ahash"] = _ahash_hex(img_gray, config.AHASH_IMG_SIZE)
+
+            # Color Hashes
+            if img.mode in ('L', 'LA') and hashes["phash"]:
+                # Single-band source: R, G and B would all be that band, so every colour hash equals
+                # its grayscale counterpart and the RGB conversion and three channel DCTs can be skipped.
+                hashes["color_ahash"] = hashes["ahash"]
+                hashes["color_dhash"] = hashes["dhash"]
+                hashes["color_phash"] = hashes["phash"] * 3
+                return hashes
+
+            img_rgb = None
             try:
-                img_rgb = img.convert('RGB')
+                img_rgb = img if img.mode == 'RGB' else img.convert('RGB') # Ensure RGBA is converted to RGB
             except ValueError as e:
                 print(f"        WARNING: Could not convert image {img_path} to RGB for color hashing: {e}", file=sys.stderr)
-        else:
-            img_rgb = img.convert('RGB') # Ensure RGBA is converted to RGB
 
-        if img_rgb:
-            try:
-                hashes["color_ahash"] = str(imagehash.average_hash(img_rgb, hash_size=config.AHASH_IMG_SIZE))
-                hashes["color_dhash"] = str(imagehash.dhash(img_rgb, hash_size=config.DHASH_IMG_SIZE))
-                
-                # Color pHash (concatenating R, G, B channel phashes)
-                phash_r = imagehash.phash(img_rgb.getchannel('R'), hash_size=config.PHASH_IMG_SIZE)
-                phash_g = imagehash.phash(img_rgb.getchannel('G'), hash_size=config.PHASH_IMG_SIZE)
-                phash_b = imagehash.phash(img_rgb.getchannel('B'), hash_size=config.PHASH_IMG_SIZE)
-                hashes["color_phash"] = str(phash_r) + str(phash_g) + str(phash_b)
-            except Exception as e:
-                print(f"        WARNING: Failed to calculate some color hashes for {img_path}: {e}", file=sys.stderr)
-        
-        img.close()
+            if img_rgb:
+                try:
+                    # The colour aHash/dHash have always been taken over the 'L' reduction of the RGB image
+                    # (as imagehash did). For L/RGB/RGBA sources that is the grayscale image above.
+                    if img_gray and img.mode in ('L', 'RGB', 'RGBA'):
+                        hashes["color_ahash"] = hashes["ahash"]
+                        hashes["color_dhash"] = hashes["dhash"]
+                    else:
+                        img_rgb_gray = img_rgb.convert('L')
+                        hashes["color_ahash"] = _ahash_hex(img_rgb_gray, config.AHASH_IMG_SIZE)
+                        hashes["color_dhash"] = _dhash_hex(img_rgb_gray, config.DHASH_IMG_SIZE)
+
+                    # Color pHash (concatenating R, G, B channel phashes)
+                    channels = img_rgb.split()
+                    if hashes["phash"] and img.mode in ('RGB', 'RGBA') and _is_grayscale(channels):
+                        # Grayscale stored as RGB: with R == G == B the 'L' conversion reproduces that
+                        # band exactly, so each channel pHash is the grayscale pHash.
+                        hashes["color_phash"] = hashes["phash"] * 3
+                    else:
+                        hashes["color_phash"] = "".join(_phash_hex(channel, config.PHASH_IMG_SIZE) for channel in channels)
+                except Exception as e:
+                    print(f"        WARNING: Failed to calculate some color hashes for {img_path}: {e}", file=sys.stderr)
     except FileNotFoundError:
         print(f"        ERROR: Image file not found for hashing: {img_path}", file=sys.stderr)
     except UnidentifiedImageError:
@@ -64,9 +126,31 @@ def calculate_image_hashes(img_path: str) -> dict:
         print(f"        ERROR: Processing image {img_path} for hashing: {e}", file=sys.stderr)
     return hashes
 
+def compute_dds_hashes(full_file_path: str, file_size: int | None = None) -> tuple[str | None, dict | None]:
+    """
+    Calculates the SHA256 and the image hashes of a DDS file.
+    Has no database access, so it can run on a worker thread ahead of index_dds_file.
+    The file is read once and the same bytes feed both the SHA256 and the image decoder;
+    only unusually large textures are hashed (mmap) and decoded from disk separately.
+    file_size, if known from a directory scan, saves the stat for that decision.
+    """
+    try:
+        if (file_size if file_size is not None else os.path.getsize(full_file_path)) >= MMAP_HASH_THRESHOLD:
+            file_hash = sha256_file(full_file_path)
+            return (file_hash, calculate_image_hashes(full_file_path)) if file_hash else (None, None)
+        with open(full_file_path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        print(f"ERROR: Error reading file for SHA256 hashing {full_file_path}: {e}", file=sys.stderr)
+        return None, None
+    return hashlib.sha256(data).hexdigest(), calculate_image_hashes(full_file_path, data)
+
 def index_dds_file(conn,
                    full_file_path: str,
-                   rel_path_for_db: str) -> str | None:
+                   rel_path_for_db: str,
+                   file_hash: str | None = None,
+                   image_hashes: dict | None = None,
+                   size_mtime: tuple | None = None) -> str | None:
     """
     Indexes a DDS file, including calculating and storing various image hashes.
 
@@ -74,6 +158,9 @@ def index_dds_file(conn,
         conn: Active SQLite database connection.
         full_file_path: The absolute path to the DDS file on disk.
         rel_path_for_db: The relative path string to be stored in the database.
+        file_hash: Precomputed SHA256 of the file (e.g. from compute_dds_hashes), if available.
+        image_hashes: Precomputed image hashes, if available.
+        size_mtime: (size, mtime_ns) from the caller's directory scan, if available.
 
     Returns:
         The UUID of the indexed DDS file, or None if indexing failed.
@@ -81,7 +168,14 @@ def index_dds_file(conn,
     table_name = get_table_name_for_ext(".dds")
     group_name = config.EXT_GROUPS.get(".dds", "textures_dds")
 
-    file_hash = sha256_file(full_file_path)
+    file_size, file_mtime_ns = size_mtime or file_stat(full_file_path)
+    known_uuid = db_ops.get_unchanged_file_uuid(conn, table_name, rel_path_for_db, file_size, file_mtime_ns)
+    if known_uuid: # Already indexed and untouched since: nothing to hash
+        logger.info("    Found existing DDS: %s (UUID: %s, unchanged)", rel_path_for_db, known_uuid)
+        return known_uuid
+
+    if file_hash is None:
+        file_hash, image_hashes = compute_dds_hashes(full_file_path, file_size) # One read for both
     if file_hash is None:
         print(f"    Failed to get SHA256 hash for DDS: {full_file_path}", file=sys.stderr)
         return None
@@ -90,7 +184,8 @@ def index_dds_file(conn,
     path_hash = md5_string(path_hash_content)
     file_uuid = generate_uuid(file_hash, path_hash)
 
-    image_hashes = calculate_image_hashes(full_file_path)
+    if image_hashes is None:
+        image_hashes = calculate_image_hashes(full_file_path)
 
     data_to_insert = {
         "uuid": file_uuid,
@@ -98,6 +193,8 @@ def index_dds_file(conn,
         "source_path": rel_path_for_db,
         "file_hash": file_hash,
         "path_hash": path_hash,
+        "file_size": file_size,
+        "file_mtime_ns": file_mtime_ns,
         "group_name": group_name,
         **image_hashes # Spread the image hash dictionary
     }
@@ -105,9 +202,9 @@ def index_dds_file(conn,
     inserted_uuid = db_ops.insert_file_entry(conn, table_name, data_to_insert)
 
     if inserted_uuid == file_uuid:
-        print(f"    Indexed DDS: {rel_path_for_db} (UUID: {file_uuid})")
+        logger.info("    Indexed DDS: %s (UUID: %s)", rel_path_for_db, file_uuid)
     elif inserted_uuid:
-        print(f"    Found existing DDS: {rel_path_for_db} (UUID: {inserted_uuid})")
+        logger.info("    Found existing DDS: %s (UUID: %s)", rel_path_for_db, inserted_uuid)
     else:
         print(f"    Failed to index/find DDS: {rel_path_for_db}", file=sys.stderr)
         return None
@@ -1,7 +1,7 @@
 import os
 import sys
 import config
-from core_utils import sha256_file, md5_string, generate_uuid, get_relative_path
+from core_utils import sha256_file, md5_string, generate_uuid, file_stat, get_relative_path, logger
 from db import operations as db_ops
 from db.schema import get_table_name_for_ext
 
@@ -9,7 +9,9 @@ def index_generic_file(conn,
                        full_file_path: str,
                        rel_path_for_db: str, # This is the path used for DB uniqueness and identification
                        file_ext_for_table_lookup: str, # The extension to determine the target table
-                       group_name: str) -> str | None:
+                       group_name: str,
+                       file_hash: str | None = None,
+                       size_mtime: tuple | None = None) -> str | None:
     """
     Indexes a generic file into the appropriate database table.
 
@@ -20,6 +22,8 @@ def index_generic_file(conn,
                          This path should be unique within its context (e.g., relative to STR_INPUT_DIR or OUTPUT_BASE_DIR).
         file_ext_for_table_lookup: The file extension (e.g., ".txt", ".blend") used to find the target table.
         group_name: The group name for the file type (e.g., "other", "models_blend").
+        file_hash: Precomputed SHA256 of the file, if available (skips re-reading it).
+        size_mtime: (size, mtime_ns) from the caller's directory scan, if available (skips a stat).
 
     Returns:
         The UUID of the indexed file, or None if indexing failed.
@@ -31,16 +35,23 @@ def index_generic_file(conn,
         print(f"    WARNING: index_generic_file called for a DDS file: {full_file_path}. Use dds_file_indexer.index_dds_file.", file=sys.stderr)
         # Delegate to dds_indexer if desired, or simply return None to enforce specific usage
         from .dds_file_indexer import index_dds_file # Local import to avoid circularity at module level
-        return index_dds_file(conn, full_file_path, rel_path_for_db)
+        return index_dds_file(conn, full_file_path, rel_path_for_db, file_hash, size_mtime=size_mtime)
 
     if table_name == get_table_name_for_ext(".str"):
         print(f"    WARNING: index_generic_file called for an STR file: {full_file_path}. Use str_archive_indexer.index_str_archive.", file=sys.stderr)
         # Delegate or return None
         from .str_archive_indexer import index_str_archive # Local import
-        return index_str_archive(conn, full_file_path, rel_path_for_db)
+        return index_str_archive(conn, full_file_path, rel_path_for_db, file_hash, size_mtime)
 
 
-    file_hash = sha256_file(full_file_path)
+    file_size, file_mtime_ns = size_mtime or file_stat(full_file_path)
+    known_uuid = db_ops.get_unchanged_file_uuid(conn, table_name, rel_path_for_db, file_size, file_mtime_ns)
+    if known_uuid: # Already indexed and untouched since: nothing to hash
+        logger.info("    Found existing generic: %s (UUID: %s, unchanged)", rel_path_for_db, known_uuid)
+        return known_uuid
+
+    if file_hash is None:
+        file_hash = sha256_file(full_file_path)
     if file_hash is None:
         print(f"    Failed to get SHA256 hash for generic file: {full_file_path}", file=sys.stderr)
         return None
@@ -55,15 +66,17 @@ def index_generic_file(conn,
         "source_path": rel_path_for_db, # Storing the carefully constructed relative path
         "file_hash": file_hash,
         "path_hash": path_hash,
+        "file_size": file_size,
+        "file_mtime_ns": file_mtime_ns,
         "group_name": group_name
     }
 
     inserted_uuid = db_ops.insert_file_entry(conn, table_name, data_to_insert)
 
     if inserted_uuid == file_uuid : # Successfully inserted this new one
-        print(f"    Indexed generic: {rel_path_for_db} (UUID: {file_uuid}) into {table_name}")
+        logger.info("    Indexed generic: %s (UUID: %s) into %s", rel_path_for_db, file_uuid, table_name)
     elif inserted_uuid: # Entry already existed
-        print(f"    Found existing generic: {rel_path_for_db} (UUID: {inserted_uuid}) in {table_name}")
+        logger.info("    Found existing generic: %s (UUID: %s) in %s", rel_path_for_db, inserted_uuid, table_name)
     else: # Failed to insert and not found
         print(f"    Failed to index/find generic: {rel_path_for_db} in {table_name}", file=sys.stderr)
         return None
@@ -1,13 +1,15 @@
 import os
 import sys
 import config
-from core_utils import sha256_file, md5_string, generate_uuid
+from core_utils import sha256_file, md5_string, generate_uuid, file_stat, logger
 from db import operations as db_ops
 from db.schema import get_table_name_for_ext
 
 def index_str_archive(conn,
                       full_file_path: str,
-                      rel_path_for_db: str) -> str | None:
+                      rel_path_for_db: str,
+                      file_hash: str | None = None,
+                      size_mtime: tuple | None = None) -> str | None:
     """
     Indexes a .str archive file itself (not its content).
 
@@ -15,6 +17,8 @@ def index_str_archive(conn,
         conn: Active SQLite database connection.
         full_file_path: The absolute path to the .str file on disk.
         rel_path_for_db: The relative path string to be stored in the database.
+        file_hash: Precomputed SHA256 of the archive, if available.
+        size_mtime: (size, mtime_ns) from the caller's directory scan, if available.
 
     Returns:
         The UUID of the indexed .str archive, or None if indexing failed.
@@ -23,7 +27,14 @@ def index_str_archive(conn,
     group_name = config.EXT_GROUPS.get(".str", "audio_root")
 
 
-    file_hash = sha256_file(full_file_path)
+    file_size, file_mtime_ns = size_mtime or file_stat(full_file_path)
+    known_uuid = db_ops.get_unchanged_file_uuid(conn, table_name, rel_path_for_db, file_size, file_mtime_ns)
+    if known_uuid: # Already indexed and untouched since: nothing to hash
+        logger.info("    Found existing .str archive: %s (UUID: %s, unchanged)", rel_path_for_db, known_uuid)
+        return known_uuid
+
+    if file_hash is None:
+        file_hash = sha256_file(full_file_path)
     if file_hash is None:
         print(f"    Failed to get SHA256 hash for .str archive: {full_file_path}", file=sys.stderr)
         return None
@@ -38,15 +49,17 @@ def index_str_archive(conn,
         "source_path": rel_path_for_db,
         "file_hash": file_hash,
         "path_hash": path_hash,
+        "file_size": file_size,
+        "file_mtime_ns": file_mtime_ns,
         "group_name": group_name # Store group for STR files too
     }
 
     inserted_uuid = db_ops.insert_file_entry(conn, table_name, data_to_insert)
 
     if inserted_uuid == file_uuid:
-        print(f"    Indexed .str archive: {rel_path_for_db} (UUID: {file_uuid})")
+        logger.info("    Indexed .str archive: %s (UUID: %s)", rel_path_for_db, file_uuid)
     elif inserted_uuid: # Already exists
-        print(f"    Found existing .str archive: {rel_path_for_db} (UUID: {inserted_uuid})")
+        logger.info("    Found existing .str archive: %s (UUID: %s)", rel_path_for_db, inserted_uuid)
     else:
         print(f"    Failed to index/find .str archive: {rel_path_for_db}", file=sys.stderr)
         return None
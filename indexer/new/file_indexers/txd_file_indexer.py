@@ -1,18 +1,46 @@
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 import config
-from core_utils import get_relative_path
+from core_utils import get_relative_path, file_stat, iter_files_with_ext, logger
+from db.schema import get_table_name_for_ext
 from db import operations as db_ops # For relationship creation
 from file_indexers.generic_file_indexer import index_generic_file # TXD is a generic file type initially
-from file_indexers.dds_file_indexer import index_dds_file         # For indexing DDS files found within TXD context
-from relationship_builder import add_txd_dds_relationship
+from file_indexers.dds_file_indexer import index_dds_file, compute_dds_hashes # For indexing DDS files found within TXD context
+from relationship_builder import add_txd_dds_relationships
+
+def add_to_txd_dds_map(dds_by_txd_folder: dict, dds_entry: os.DirEntry, scan_base_dir: str):
+    """
+    Files a DDS found during a directory sweep under every enclosing <name>_txd folder below
+    scan_base_dir, so TXDs can later pick up their DDS files without scanning the folder again.
+    Keys are the folder paths as built by the sweep, passed through os.path.normcase so that lookups
+    (see get_txd_dds_folder) are case-insensitive on Windows, like the isdir() check they replace.
+    """
+    folder = os.path.dirname(dds_entry.path)
+    while len(folder) > len(scan_base_dir):
+        folder_key = os.path.normcase(folder)
+        if folder_key.endswith("_txd"):
+            dds_by_txd_folder.setdefault(folder_key, []).append(dds_entry)
+        folder = os.path.dirname(folder)
+
+def get_txd_dds_folder(txd_file_full_path: str) -> str:
+    """Path of the conventional <txd_name>_txd folder holding a TXD's extracted DDS files."""
+    txd_filename_no_ext = os.path.splitext(os.path.basename(txd_file_full_path))[0]
+    # The _txd folder is expected to be ADJACENT to the .txd file,
+    # or within an extraction structure that mimics this.
+    # If TXDs are extracted from STRs, their _txd folders will be relative to the STR's extraction path.
+    
+    # If the TXD is in STR_INPUT_DIR, its _txd is also expected there.
+    # If the TXD is in OUTPUT_BASE_DIR/some_extraction_path, its _txd is there.
+    return os.path.join(os.path.dirname(txd_file_full_path), txd_filename_no_ext + "_txd")
 
 def process_txd_contained_dds_files(conn,
                                     txd_file_uuid: str,
                                     txd_file_full_path: str,
                                     # Base directory for calculating relative paths of the DDS files
                                     # This could be STR_INPUT_DIR or an extraction output directory.
-                                    dds_files_rel_path_base_dir: str):
+                                    dds_files_rel_path_base_dir: str,
+                                    dds_entries: list | None = None):
     """
     Processes DDS files found in the conventional folder (<txd_name>_txd)
     associated with a given TXD file.
@@ -26,37 +54,48 @@ def process_txd_contained_dds_files(conn,
                                      the found DDS files should be calculated for DB storage.
                                      For root TXDs, this is STR_INPUT_DIR.
                                      For extracted TXDs, this is OUTPUT_BASE_DIR.
+        dds_entries: The DDS files of the _txd folder as os.DirEntry objects, if the caller already
+                     collected them during its own directory sweep (see add_to_txd_dds_map).
+                     If None, the folder is scanned here.
     """
-    txd_filename_no_ext = os.path.splitext(os.path.basename(txd_file_full_path))[0]
-    # The _txd folder is expected to be ADJACENT to the .txd file,
-    # or within an extraction structure that mimics this.
-    # If TXDs are extracted from STRs, their _txd folders will be relative to the STR's extraction path.
-    
-    # If the TXD is in STR_INPUT_DIR, its _txd is also expected there.
-    # If the TXD is in OUTPUT_BASE_DIR/some_extraction_path, its _txd is there.
-    parent_dir_of_txd = os.path.dirname(txd_file_full_path)
-    dds_folder_name = txd_filename_no_ext + "_txd"
-    dds_folder_full_path = os.path.join(parent_dir_of_txd, dds_folder_name)
+    dds_folder_full_path = get_txd_dds_folder(txd_file_full_path)
 
-    if not os.path.isdir(dds_folder_full_path):
-        # print(f"        Info: DDS folder not found for {os.path.basename(txd_file_full_path)} at: {dds_folder_full_path}")
+    if dds_entries is None:
+        if not os.path.isdir(dds_folder_full_path):
+            # print(f"        Info: DDS folder not found for {os.path.basename(txd_file_full_path)} at: {dds_folder_full_path}")
+            return
+        dds_entries = iter_files_with_ext(dds_folder_full_path, ".dds")
+    elif not dds_entries:
         return
 
-    print(f"        Processing DDS files for {os.path.basename(txd_file_full_path)} in: {dds_folder_full_path}")
-    for dds_root, _, dds_filenames in os.walk(dds_folder_full_path):
-        for dds_filename in dds_filenames:
-            if dds_filename.lower().endswith(".dds"):
-                full_dds_file_path = os.path.join(dds_root, dds_filename)
-                
-                # Relative path for the DDS file for DB storage.
-                # This should make the DDS path unique and identifiable.
-                dds_rel_path_for_db = get_relative_path(full_dds_file_path, dds_files_rel_path_base_dir)
+    logger.info("        Processing DDS files for %s in: %s", os.path.basename(txd_file_full_path), dds_folder_full_path)
+    dds_table_name = get_table_name_for_ext(".dds")
+    dds_files = [] # (full path, relative path for DB, (size, mtime_ns), already indexed and unchanged)
+    for dds_entry in dds_entries:
+        full_dds_file_path = dds_entry.path
+        # Relative path for the DDS file for DB storage.
+        # This should make the DDS path unique and identifiable.
+        dds_rel_path_for_db = get_relative_path(full_dds_file_path, dds_files_rel_path_base_dir)
+        size_mtime = file_stat(dds_entry)
+        is_known = db_ops.get_unchanged_file_uuid(conn, dds_table_name, dds_rel_path_for_db, *size_mtime) is not None
+        dds_files.append((full_dds_file_path, dds_rel_path_for_db, size_mtime, is_known))
+
+    # Hash on worker threads; DB writes stay on this thread in the original order.
+    dds_file_uuids = []
+    with ThreadPoolExecutor(max_workers=config.HASH_WORKERS) as pool:
+        hashed = pool.map(compute_dds_hashes,
+                          [path for path, _, _, is_known in dds_files if not is_known],
+                          [size_mtime[0] for _, _, size_mtime, is_known in dds_files if not is_known])
+        for full_dds_file_path, dds_rel_path_for_db, size_mtime, is_known in dds_files:
+            file_hash, image_hashes = (None, None) if is_known else next(hashed)
+            dds_file_uuid = index_dds_file(conn, full_dds_file_path, dds_rel_path_for_db, file_hash, image_hashes, size_mtime)
+            if dds_file_uuid:
+                dds_file_uuids.append(dds_file_uuid)
+            # else:
+                # print(f"            Skipping TXD-DDS relationship for {os.path.basename(full_dds_file_path)} due to indexing failure or missing TXD UUID.")
 
-                dds_file_uuid = index_dds_file(conn, full_dds_file_path, dds_rel_path_for_db)
-                if dds_file_uuid and txd_file_uuid:
-                    add_txd_dds_relationship(conn, txd_file_uuid, dds_file_uuid)
-                # else:
-                    # print(f"            Skipping TXD-DDS relationship for {dds_filename} due to indexing failure or missing TXD UUID.")
+    # All of this TXD's relationships in one executemany
+    add_txd_dds_relationships(conn, txd_file_uuid, dds_file_uuids)
 
 
 def index_txd_file(conn,
@@ -65,7 +104,10 @@ def index_txd_file(conn,
                    # Base dir for any DDS files that might be found alongside this TXD
                    # (e.g. STR_INPUT_DIR if this TXD is a root file, or
                    # OUTPUT_BASE_DIR if this TXD was extracted from an STR).
-                   associated_dds_rel_path_base: str) -> str | None:
+                   associated_dds_rel_path_base: str,
+                   file_hash: str | None = None,
+                   dds_entries: list | None = None,
+                   size_mtime: tuple | None = None) -> str | None:
     """
     Indexes a TXD file and then processes any associated DDS files.
 
@@ -75,6 +117,9 @@ def index_txd_file(conn,
         rel_path_for_db: Relative path for storing the TXD file in the database.
         associated_dds_rel_path_base: The base directory for calculating relative paths
                                       of DDS files found in the <txd_name>_txd folder.
+        file_hash: Precomputed SHA256 of the TXD file, if available.
+        dds_entries: The DDS files of its _txd folder, if already collected by the caller's sweep.
+        size_mtime: (size, mtime_ns) of the TXD from the caller's directory scan, if available.
 
     Returns:
         The UUID of the indexed TXD file, or None if failed.
@@ -83,12 +128,14 @@ def index_txd_file(conn,
     group_name = config.EXT_GROUPS.get(file_ext, "textures")
 
     # 1. Index the TXD file itself as a generic file
-    print(f"    Indexing TXD: {rel_path_for_db}")
+    logger.info("    Indexing TXD: %s", rel_path_for_db)
     txd_file_uuid = index_generic_file(conn,
                                        full_file_path,
                                        rel_path_for_db,
                                        file_ext,
-                                       group_name)
+                                       group_name,
+                                       file_hash,
+                                       size_mtime)
 
     if not txd_file_uuid:
         print(f"    Failed to index TXD file: {full_file_path}. Skipping associated DDS processing.", file=sys.stderr)
@@ -96,6 +143,6 @@ def index_txd_file(conn,
 
     # 2. Process associated DDS files (if any)
     # The _txd folder is expected to be in the same directory as the .txd file itself.
-    process_txd_contained_dds_files(conn, txd_file_uuid, full_file_path, associated_dds_rel_path_base)
+    process_txd_contained_dds_files(conn, txd_file_uuid, full_file_path, associated_dds_rel_path_base, dds_entries)
 
     return txd_file_uuid
\ No newline at end of file
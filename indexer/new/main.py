@@ -1,4 +1,6 @@
+import logging
 import os
+import sqlite3
 import sys
 import time
 
@@ -34,6 +36,8 @@ def initial_checks():
 
 def main():
     start_time = time.time()
+    # Per-file progress lines (core_utils.logger), printed like the rest of the output
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(message)s", stream=sys.stdout)
     print("Starting Simpsons Game File Processor...")
 
     initial_checks()
@@ -46,11 +50,14 @@ def main():
             print("FATAL: Could not establish database connection.", file=sys.stderr)
             sys.exit(1)
 
-        db_schema.initialize_database(conn)
+        db_schema.initialize_database(conn, defer_secondary_indexes=config.DEFER_SECONDARY_INDEXES)
 
         # Run the main processing logic
         run_processing_passes(conn)
 
+        if config.DEFER_SECONDARY_INDEXES:
+            db_schema.ensure_secondary_indexes(conn)
+
     except sqlite3.Error as e:
         print(f"FATAL DATABASE ERROR: {e}", file=sys.stderr)
         # Potentially log detailed error
@@ -60,6 +67,10 @@ def main():
         traceback.print_exc()
     finally:
         if conn:
+            try:
+                conn.commit() # Keep whatever the interrupted batch had already indexed
+            except sqlite3.Error as e:
+                print(f"ERROR: Failed to commit pending changes: {e}", file=sys.stderr)
             db_conn.close_db_connection()
 
     end_time = time.time()
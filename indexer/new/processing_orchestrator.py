@@ -1,7 +1,9 @@
+import contextlib
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import config
-from core_utils import get_relative_path, ensure_dir_exists
+from core_utils import get_relative_path, ensure_dir_exists, sha256_file, file_stat, iter_files, get_file_ext, drop_file_cache
 from db import schema as db_schema, operations as db_ops
 from file_indexers import (
     index_generic_file,
@@ -9,8 +11,93 @@ from file_indexers import (
     index_str_archive,
     index_txd_file
 )
+from file_indexers.dds_file_indexer import compute_dds_hashes
+from file_indexers.txd_file_indexer import add_to_txd_dds_map, get_txd_dds_folder
 from extraction_manager import extract_str_file, get_extraction_output_dir
-from relationship_builder import add_str_content_relationship, process_relationships_in_extracted_dir
+from relationship_builder import add_str_content_relationships, process_relationships_in_extracted_dir
+
+
+def _compute_file_hashes(full_file_path: str, file_ext: str, file_size: int | None) -> tuple[str | None, dict | None]:
+    """
+    Worker for the hashing pool: returns (sha256, image_hashes) for one file.
+    image_hashes is only filled for DDS textures. Never touches the database.
+    """
+    try:
+        if file_ext == ".dds":
+            return compute_dds_hashes(full_file_path, file_size)
+        return sha256_file(full_file_path), None
+    except Exception as e:
+        print(f"    ERROR hashing {full_file_path}: {e}", file=sys.stderr)
+        return None, None
+
+
+# Per-extension indexers, all called as
+# (conn, full_file_path, rel_path_for_db, file_ext, dds_rel_path_base, file_hash, image_hashes, size_mtime, dds_by_txd_folder).
+# dds_rel_path_base is the directory TXD-contained DDS paths are stored relative to;
+# size_mtime is the file's (size, mtime_ns) from the scan;
+# dds_by_txd_folder maps <name>_txd folders to the DDS entries the scan found in them.
+def _index_dds(conn, full_file_path, rel_path_for_db, file_ext, dds_rel_path_base, file_hash, image_hashes, size_mtime, dds_by_txd_folder):
+    return index_dds_file(conn, full_file_path, rel_path_for_db, file_hash, image_hashes, size_mtime)
+
+def _index_txd(conn, full_file_path, rel_path_for_db, file_ext, dds_rel_path_base, file_hash, image_hashes, size_mtime, dds_by_txd_folder):
+    # None (no DDS seen under that exact name) lets the TXD indexer fall back to checking the folder itself
+    dds_entries = dds_by_txd_folder.get(os.path.normcase(get_txd_dds_folder(full_file_path)))
+    return index_txd_file(conn, full_file_path, rel_path_for_db, dds_rel_path_base, file_hash, dds_entries, size_mtime)
+
+def _index_generic(conn, full_file_path, rel_path_for_db, file_ext, dds_rel_path_base, file_hash, image_hashes, size_mtime, dds_by_txd_folder):
+    # Generic files including .blend, .preinstanced, .glb, .fbx, .lua, .bin, etc.
+    group_name = config.EXT_GROUPS.get(file_ext, "unknown")
+    return index_generic_file(conn, full_file_path, rel_path_for_db, file_ext, group_name, file_hash, size_mtime)
+
+# Add entries here for other specific indexers; anything else is indexed by _index_generic.
+FILE_INDEXERS = {
+    ".dds": _index_dds,
+    ".txd": _index_txd,
+}
+
+
+def _hash_pending_files(pool: ThreadPoolExecutor, files_to_index: list):
+    """
+    Yields (file_hash, image_hashes) for each entry of files_to_index, in order.
+    Entries already indexed and unchanged on disk get (None, None) and are never read;
+    the indexers return their stored UUID without hashing.
+    """
+    hashed = pool.map(_compute_file_hashes,
+                      [entry[0] for entry in files_to_index if not entry[-1]],
+                      [entry[1] for entry in files_to_index if not entry[-1]],
+                      [entry[3][0] for entry in files_to_index if not entry[-1]])
+    for entry in files_to_index:
+        yield (None, None) if entry[-1] else next(hashed)
+
+
+def _is_unchanged_in_db(conn, size_mtime: tuple, file_ext: str, rel_path_for_db: str) -> bool:
+    """True if the file is already indexed under rel_path_for_db and its size/mtime still match."""
+    table_name = db_schema.get_table_name_for_ext(file_ext)
+    return db_ops.get_unchanged_file_uuid(conn, table_name, rel_path_for_db, *size_mtime) is not None
+
+
+def _txd_last(file_entry: tuple) -> bool:
+    """
+    Sort key that moves .txd files to the end: the DDS files in their <name>_txd folders
+    are then already indexed by the scan and the TXD pass finds them without re-hashing.
+    """
+    return file_entry[1] == ".txd"
+
+
+def _archives_as_ready(str_archives: list, pending_extractions: dict):
+    """
+    Yields (archive, extraction_result) for every Pass 2 archive in the order it can be indexed:
+    first those that need no extraction (result None), then the others as their QuickBMS runs finish,
+    so a slow archive doesn't hold up the indexing of ones already extracted.
+    pending_extractions maps an archive's full path to its extraction future.
+    """
+    for archive in str_archives:
+        if archive[0] not in pending_extractions:
+            yield archive, None
+    archives_by_future = {pending_extractions[archive[0]]: archive for archive in str_archives
+                          if archive[0] in pending_extractions}
+    for future in as_completed(archives_by_future):
+        yield archives_by_future[future], future.result()
 
 
 def process_and_index_extracted_str_content(conn,
@@ -35,43 +122,46 @@ def process_and_index_extracted_str_content(conn,
     # For building relationships like .blend <-> .preinstanced within this extraction context
     # Key: file extension (e.g., '.blend'), Value: dict of {rel_path_in_extraction: uuid}
     indexed_content_details = {}
+    # (content_file_uuid, content_table_name) of everything indexed, linked to the STR in one batch at the end
+    str_content_files = []
 
-    for root, _, files in os.walk(str_extraction_base_dir):
-        for file_name in files:
-            files_found_in_extraction += 1
-            full_file_path = os.path.join(root, file_name)
-            file_ext = os.path.splitext(file_name)[1].lower()
+    files_to_index = []
+    dds_by_txd_folder = {} # <name>_txd folder -> DDS entries, so TXDs don't rescan their folders
+    for file_entry in iter_files(str_extraction_base_dir):
+        files_found_in_extraction += 1
+        full_file_path = file_entry.path
+        file_ext = get_file_ext(file_entry.name)
+        if file_ext == ".dds":
+            add_to_txd_dds_map(dds_by_txd_folder, file_entry, str_extraction_base_dir)
 
-            # Relative path for DB storage: relative to OUTPUT_BASE_DIR
-            # This makes the path globally unique within the output structure.
-            rel_path_for_db = get_relative_path(full_file_path, config.OUTPUT_BASE_DIR)
+        if not file_ext: # Skip files with no extension, or handle as 'unknown'
+            print(f"        Skipping file with no extension: {full_file_path}", file=sys.stderr)
+            continue
+        # Relative path for DB storage: relative to OUTPUT_BASE_DIR
+        # This makes the path globally unique within the output structure.
+        rel_path_for_db = get_relative_path(full_file_path, config.OUTPUT_BASE_DIR)
+        size_mtime = file_stat(file_entry) # From the scan; reused by the hashing and indexing below
+        is_known = _is_unchanged_in_db(conn, size_mtime, file_ext, rel_path_for_db)
+        files_to_index.append((full_file_path, file_ext, rel_path_for_db, size_mtime, is_known))
+    files_to_index.sort(key=_txd_last)
 
+    # Hash on worker threads while this thread does the (single-writer) DB inserts in walk order.
+    with ThreadPoolExecutor(max_workers=config.HASH_WORKERS) as pool:
+        hashed = _hash_pending_files(pool, files_to_index)
+        for (full_file_path, file_ext, rel_path_for_db, size_mtime, _), (file_hash, image_hashes) in zip(files_to_index, hashed):
             # Relative path within this specific extraction, for finding related files
             # (e.g. a .blend and .preinstanced with the same relative path inside this _str folder)
             rel_path_within_extraction = get_relative_path(full_file_path, str_extraction_base_dir)
 
-            group_name = config.EXT_GROUPS.get(file_ext, "unknown")
-            content_file_uuid = None
             content_table_name = db_schema.get_table_name_for_ext(file_ext)
 
-            if not file_ext: # Skip files with no extension, or handle as 'unknown'
-                print(f"        Skipping file with no extension: {full_file_path}", file=sys.stderr)
-                continue
-
             try:
-                if file_ext == ".dds":
-                    content_file_uuid = index_dds_file(conn, full_file_path, rel_path_for_db)
-                elif file_ext == ".txd":
-                    # For TXDs extracted from STRs, their _txd folders will be relative to OUTPUT_BASE_DIR
-                    content_file_uuid = index_txd_file(conn, full_file_path, rel_path_for_db, config.OUTPUT_BASE_DIR)
-                # Add elif for other specific indexers if they are not handled by generic_file_indexer logic
-                # For example, if .blend files needed very special pre-processing before generic indexing.
-                else: # Generic files including .blend, .preinstanced, .glb, .fbx, .lua, .bin, etc.
-                      # STR and DDS are excluded by get_table_name_for_ext checks in generic_file_indexer
-                    content_file_uuid = index_generic_file(conn, full_file_path, rel_path_for_db, file_ext, group_name)
+                # For TXDs extracted from STRs, their _txd folders will be relative to OUTPUT_BASE_DIR
+                index_file = FILE_INDEXERS.get(file_ext, _index_generic)
+                content_file_uuid = index_file(conn, full_file_path, rel_path_for_db, file_ext, config.OUTPUT_BASE_DIR, file_hash, image_hashes, size_mtime, dds_by_txd_folder)
 
                 if content_file_uuid:
-                    add_str_content_relationship(conn, parent_str_uuid, content_file_uuid, content_table_name)
+                    str_content_files.append((content_file_uuid, content_table_name))
                     
                     # Store details for intra-extraction relationship processing
                     if file_ext not in indexed_content_details:
@@ -82,6 +172,8 @@ def process_and_index_extracted_str_content(conn,
                 print(f"    ERROR indexing extracted file {full_file_path}: {e}", file=sys.stderr)
                 # Optionally, log to a file or raise if critical
 
+    add_str_content_relationships(conn, parent_str_uuid, str_content_files)
+
     if files_found_in_extraction == 0:
         print(f"    Warning: No files found to index in extracted directory: {str_extraction_base_dir}", file=sys.stderr)
     else:
@@ -89,109 +181,142 @@ def process_and_index_extracted_str_content(conn,
         process_relationships_in_extracted_dir(conn, indexed_content_details)
 
 
+@contextlib.contextmanager
+def _extraction_pool():
+    """
+    ThreadPoolExecutor for the QuickBMS runs of Pass 2. Unlike a plain `with` block, leaving it through
+    an exception (Ctrl-C included) cancels the extractions still queued instead of waiting for all of them.
+    """
+    pool = ThreadPoolExecutor(max_workers=config.EXTRACTION_WORKERS)
+    try:
+        yield pool
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True) # Running QuickBMS processes finish; queued ones never start
+        raise
+    pool.shutdown()
+
 def run_processing_passes(conn):
     """
     Runs the main processing passes:
     1. Scan STR_INPUT_DIR for root-level files (non-STR), index them.
        Handles TXD files and their associated _txd folders at this level.
-    2. Scan STR_INPUT_DIR for .str archives, index them, extract if necessary,
+       The same scan collects the .str archives for pass 2.
+    2. Index the .str archives, extract them if necessary,
        then index their contents and build relationships.
     """
     print(f"\n--- Pass 1: Indexing Root-Level Files (excluding .str) from: {config.STR_INPUT_DIR} ---")
     root_files_processed_count = 0
-    for root_dir, _, dir_files in os.walk(config.STR_INPUT_DIR, topdown=True):
-        # Skip the output directory itself to avoid processing already extracted files as root files
-        abs_root_dir = os.path.abspath(root_dir)
-        abs_output_base_dir = os.path.abspath(config.OUTPUT_BASE_DIR)
-        if abs_root_dir.startswith(abs_output_base_dir):
-            # print(f"    Skipping directory within OUTPUT_BASE_DIR: {root_dir}")
-            continue
-        
-        print(f"Scanning root directory: {root_dir}")
-        for file_item_name in dir_files:
-            full_file_path = os.path.join(root_dir, file_item_name)
-            file_ext = os.path.splitext(file_item_name)[1].lower()
+    root_files_to_index = []
+    str_file_paths = [] # (path, (size, mtime_ns)) of the .str archives met during the same sweep, processed in Pass 2
+    dds_by_txd_folder = {} # <name>_txd folder -> DDS entries, so TXDs don't rescan their folders
+    print(f"Scanning root files under: {config.STR_INPUT_DIR}")
+    # The output directory is pruned to avoid processing already extracted files as root files
+    for file_entry in iter_files(config.STR_INPUT_DIR, exclude_dir=config.OUTPUT_BASE_DIR):
+        full_file_path = file_entry.path
+        file_ext = get_file_ext(file_entry.name)
+        if file_ext == ".dds":
+            add_to_txd_dds_map(dds_by_txd_folder, file_entry, config.STR_INPUT_DIR)
 
-            if not file_ext or file_ext == ".str": # Skip .str archives (Pass 2) and files without extensions
-                continue
+        if file_ext == ".str": # Archives are processed in Pass 2
+            str_file_paths.append((full_file_path, file_stat(file_entry)))
+            continue
+        if not file_ext: # Skip files without extensions
+            continue
+        # Relative path for DB storage: relative to STR_INPUT_DIR for root files
+        rel_path_for_db = get_relative_path(full_file_path, config.STR_INPUT_DIR)
+        size_mtime = file_stat(file_entry) # From the scan; reused by the hashing and indexing below
+        is_known = _is_unchanged_in_db(conn, size_mtime, file_ext, rel_path_for_db)
+        root_files_to_index.append((full_file_path, file_ext, rel_path_for_db, size_mtime, is_known))
+    root_files_to_index.sort(key=_txd_last)
 
+    # Hash on worker threads while this thread does the (single-writer) DB inserts in walk order.
+    with ThreadPoolExecutor(max_workers=config.HASH_WORKERS) as pool:
+        hashed = _hash_pending_files(pool, root_files_to_index)
+        for (full_file_path, file_ext, rel_path_for_db, size_mtime, _), (file_hash, image_hashes) in zip(root_files_to_index, hashed):
             root_files_processed_count +=1
-            # Relative path for DB storage: relative to STR_INPUT_DIR for root files
-            rel_path_for_db = get_relative_path(full_file_path, config.STR_INPUT_DIR)
-            group_name = config.EXT_GROUPS.get(file_ext, "unknown")
 
             try:
-                if file_ext == ".dds":
-                    index_dds_file(conn, full_file_path, rel_path_for_db)
-                elif file_ext == ".txd":
-                    # For root TXDs, their _txd folders are relative to STR_INPUT_DIR
-                    index_txd_file(conn, full_file_path, rel_path_for_db, config.STR_INPUT_DIR)
-                else: # Other generic files
-                    index_generic_file(conn, full_file_path, rel_path_for_db, file_ext, group_name)
+                # For root TXDs, their _txd folders are relative to STR_INPUT_DIR
+                index_file = FILE_INDEXERS.get(file_ext, _index_generic)
+                index_file(conn, full_file_path, rel_path_for_db, file_ext, config.STR_INPUT_DIR, file_hash, image_hashes, size_mtime, dds_by_txd_folder)
             except Exception as e:
                 print(f"    ERROR processing root file {full_file_path}: {e}", file=sys.stderr)
+
+            if root_files_processed_count % config.DB_COMMIT_INTERVAL == 0:
+                db_ops.commit_batch(conn)
+    db_ops.commit_batch(conn)
     print(f"--- Pass 1 Complete: Processed {root_files_processed_count} root files (excluding .str). ---\n")
 
 
     print(f"\n--- Pass 2: Processing .str Archives from: {config.STR_INPUT_DIR} ---")
     str_archives_processed_count = 0
-    for root_dir, _, dir_files in os.walk(config.STR_INPUT_DIR, topdown=True):
-        abs_root_dir = os.path.abspath(root_dir)
-        abs_output_base_dir = os.path.abspath(config.OUTPUT_BASE_DIR)
-        if abs_root_dir.startswith(abs_output_base_dir):
-            continue
+    str_archives = [] # (full path, (size, mtime_ns), extraction output dir or None, extraction needed)
+    for full_str_file_path, str_size_mtime in str_file_paths: # Collected by the Pass 1 sweep; no second walk of the input tree
+        # Determine expected extraction directory
+        # str_extraction_output_dir is absolute path
+        str_extraction_output_dir = get_extraction_output_dir(full_str_file_path, config.STR_INPUT_DIR, config.OUTPUT_BASE_DIR)
+        extraction_needed = bool(str_extraction_output_dir) and not (
+            os.path.isdir(str_extraction_output_dir) and any(os.scandir(str_extraction_output_dir)))
+        str_archives.append((full_str_file_path, str_size_mtime, str_extraction_output_dir, extraction_needed))
 
-        for file_item_name in dir_files:
-            if not file_item_name.lower().endswith(".str"):
-                continue
-            
+    # QuickBMS runs as separate processes, so extractions proceed in parallel on worker threads
+    # while this thread indexes each archive as soon as its own extraction is done.
+    with _extraction_pool() as extraction_pool:
+        pending_extractions = {}
+        for full_str_file_path, _, str_extraction_output_dir, extraction_needed in str_archives:
+            if extraction_needed:
+                ensure_dir_exists(os.path.dirname(str_extraction_output_dir)) # Ensure parent of target extraction dir exists
+                pending_extractions[full_str_file_path] = extraction_pool.submit(
+                    extract_str_file,
+                    str_file_path=full_str_file_path,
+                    bms_script_path=config.BMS_SCRIPT,
+                    quickbms_exe_path=config.QUICKBMS_EXE,
+                    input_dir=config.STR_INPUT_DIR, # Base for calculating relative output structure
+                    output_base_dir=config.OUTPUT_BASE_DIR
+                )
+
+        for archive, extraction_result in _archives_as_ready(str_archives, pending_extractions):
+            full_str_file_path, str_size_mtime, str_extraction_output_dir, extraction_needed = archive
             str_archives_processed_count += 1
-            full_str_file_path = os.path.join(root_dir, file_item_name)
-            
+
             # Relative path for DB storage (for the STR file itself): relative to STR_INPUT_DIR
             rel_str_path_for_db = get_relative_path(full_str_file_path, config.STR_INPUT_DIR)
             print(f"\nProcessing .str archive: {rel_str_path_for_db}")
 
-            parent_str_uuid = index_str_archive(conn, full_str_file_path, rel_str_path_for_db)
+            parent_str_uuid = index_str_archive(conn, full_str_file_path, rel_str_path_for_db, size_mtime=str_size_mtime)
+            if extraction_needed: # Already read by QuickBMS and hashed just now; nothing reads the archive again this run
+                drop_file_cache(full_str_file_path)
             if not parent_str_uuid:
                 print(f"    Failed to index or find .str archive: {rel_str_path_for_db}. Skipping content processing.", file=sys.stderr)
                 continue
-            
-            # Determine expected extraction directory
-            # str_extraction_output_dir is absolute path
-            str_extraction_output_dir = get_extraction_output_dir(full_str_file_path, config.STR_INPUT_DIR, config.OUTPUT_BASE_DIR)
 
             if not str_extraction_output_dir:
                 print(f"    Could not determine extraction output directory for {full_str_file_path}. Skipping extraction.", file=sys.stderr)
                 continue
 
-            extraction_needed = True
-            if os.path.isdir(str_extraction_output_dir) and any(os.scandir(str_extraction_output_dir)):
+            if not extraction_needed:
                 print(f"    Extraction directory already exists and is not empty: {str_extraction_output_dir}. Assuming already extracted.")
-                extraction_needed = False # Skip extraction, proceed to indexing content
                 extraction_successful = True
-            
-            if extraction_needed:
-                print(f"    Attempting extraction for {rel_str_path_for_db}...")
-                ensure_dir_exists(os.path.dirname(str_extraction_output_dir)) # Ensure parent of target extraction dir exists
-                extraction_successful, actual_output_dir = extract_str_file(
-                    str_file_path=full_str_file_path,
-                    bms_script_path=config.BMS_SCRIPT,
-                    quickbms_exe_path=config.QUICKBMS_EXE,
-                    input_dir=config.STR_INPUT_DIR, # Base for calculating relative output structure
-                    output_base_dir=config.OUTPUT_BASE_DIR
-                )
+            else:
+                extraction_successful, actual_output_dir = extraction_result
+                if extraction_successful: # Reported here rather than by the worker, so lines don't interleave
+                    print(f"    Successfully extracted: {rel_str_path_for_db}")
                 if actual_output_dir != str_extraction_output_dir: # Should ideally match
                     print(f"    WARNING: Mismatch in expected ({str_extraction_output_dir}) and actual ({actual_output_dir}) extraction dir.", file=sys.stderr)
                     # Decide how to handle: use actual_output_dir if extraction_successful
                     if extraction_successful: str_extraction_output_dir = actual_output_dir
 
             if extraction_successful:
-                if os.path.isdir(str_extraction_output_dir): # Verify again after potential extraction
+                # Only a fresh extraction needs verifying: existing folders were found non-empty above
+                if not extraction_needed or os.path.isdir(str_extraction_output_dir):
                     process_and_index_extracted_str_content(conn, parent_str_uuid, str_extraction_output_dir)
                 else:
                     print(f"    WARNING: Extraction reported success for {rel_str_path_for_db}, but directory not found: {str_extraction_output_dir}", file=sys.stderr)
             else:
                 print(f"    Skipping content indexing for {rel_str_path_for_db} due to extraction failure.", file=sys.stderr)
 
+            # One transaction per archive: its own row, its content and their relationships
+            db_ops.commit_batch(conn)
+    db_ops.commit_batch(conn)
+
     print(f"--- Pass 2 Complete: Processed {str_archives_processed_count} .str archives. ---")
\ No newline at end of file